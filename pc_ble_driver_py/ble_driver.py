@@ -1917,59 +1917,35 @@ class BLEDriver(object):
         return keyset
 
     def generate_lesc_keyset(self, private_key=None):
-        def _int_to_list(input_integer):
-            output_list = []
-            input_hex_string = "{:X}".format(input_integer)
-
-            # Add zeros to start key if they are stripped.
-            while len(input_hex_string) < 64:
-                input_hex_string = "0" + input_hex_string
-
-            for i in range(1, len(input_hex_string), 2):
-                output_list.append(int((input_hex_string[i - 1] + input_hex_string[i]), 16))
-
-            return output_list
-
-        self._lesc_private_key = ec.generate_private_key(ec.SECP256R1(), default_backend())
         if not private_key:
-            private_key = self._lesc_private_key
-        lesc_own_public_key = private_key.public_key()
-        lesc_own_public_key_numbers = lesc_own_public_key.public_numbers()
-        lesc_own_public_key = private_key.public_key()
+            private_key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+        self._lesc_private_key = private_key
+        lesc_own_public_key_numbers = private_key.public_key().public_numbers()
         x = lesc_own_public_key_numbers.x
         y = lesc_own_public_key_numbers.y
 
-        logger.debug("ECDH key: Before: x: {:X}".format(x))
-        logger.debug("ECDH key: Before: y: {:X}".format(y))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("ECDH key: x: {:X}".format(x))
+            logger.debug("ECDH key: y: {:X}".format(y))
 
-        x_list = _int_to_list(x)[::-1]
-        y_list = _int_to_list(y)[::-1]
-
-        logger.debug("ECDH key: After: x: {}".format(" ".join(["0x{:02X}".format(i) for i in x_list])))
-        logger.debug("ECDH key: After: y: {}".format(" ".join(["0x{:02X}".format(i) for i in y_list])))
-        lesc_own_public_key_list = x_list + y_list
+        # SoftDevice expects X and Y in little endian, 32 bytes each.
+        lesc_own_public_key_list = list(x.to_bytes(32, "little") + y.to_bytes(32, "little"))
 
         # Put own lesc public key into keyset.
         lesc_pk_own = BLEGapLescP256Pk(lesc_own_public_key_list)
-        logger.debug("lesc_pk_own {}".format(lesc_pk_own))
+        logger.debug("lesc_pk_own %s", lesc_pk_own)
         self._keyset.keys_own.p_pk = lesc_pk_own.to_c()
 
         return self._keyset
 
     def generate_lesc_dhkey(self, peer_public_key):
-        def _change_endianness(input_string):
-            output = ""
-            for i in range(len(input_string) - 1, 0, -2):
-                output += input_string[i - 1]
-                output += input_string[i]
-            return output
-        lesc_pk_peer = peer_public_key
-        # Translate incoming peer public key to x an y components as integers.
-        peer_public_key_list = lesc_pk_peer.pk
-        peer_public_key_x = int(_change_endianness("".join(["{:02X}".format(i) for i in peer_public_key_list[:32]])), 16)
-        peer_public_key_y = int(_change_endianness("".join(["{:02X}".format(i) for i in peer_public_key_list[32:]])), 16)
-
-        logger.debug("Peer public DH key, big endian, x: 0x{:X}, y: 0x{:X}".format(peer_public_key_x, peer_public_key_y))
+        # Translate incoming little endian peer public key to x and y components as integers.
+        peer_public_key_bytes = bytes(peer_public_key.pk)
+        peer_public_key_x = int.from_bytes(peer_public_key_bytes[:32], "little")
+        peer_public_key_y = int.from_bytes(peer_public_key_bytes[32:], "little")
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Peer public DH key, big endian, x: 0x{:X}, y: 0x{:X}".format(peer_public_key_x, peer_public_key_y))
 
         # Generate a _EllipticCurvePublicKey object of the received peer public key.
         lesc_peer_public_key_obj = ec.EllipticCurvePublicNumbers(peer_public_key_x,
@@ -1978,14 +1954,12 @@ class BLEDriver(object):
         lesc_peer_public_key_obj2 = lesc_peer_public_key_obj.public_key(default_backend())
 
         # Calculate shared secret based on own private key and peer public key.
-        shared_key_list = self._lesc_private_key.exchange(ec.ECDH(), lesc_peer_public_key_obj2)
-        shared_key_list = list(shared_key_list)
-        shared_key_list = shared_key_list[::-1]
-        logger.debug("shared_key_list = {}".format(shared_key_list))
-
-        key_list_string = " ".join(["0x{:02X}".format(i) for i in shared_key_list])
-        logger.debug("Shared secret list, little endian: {} \n".format(key_list_string))
-        logger.debug("len(shared_key_list) = {}".format(len(shared_key_list)))
+        shared_key = self._lesc_private_key.exchange(ec.ECDH(), lesc_peer_public_key_obj2)
+        shared_key_list = list(shared_key[::-1])
+
+        if logger.isEnabledFor(logging.DEBUG):
+            key_list_string = " ".join(["0x{:02X}".format(i) for i in shared_key_list])
+            logger.debug("Shared secret list, little endian: {} \n".format(key_list_string))
         # Reply to Softdevice with shared key
         lesc_dhkey = BLEGapDHKey(shared_key_list).to_c()
         return lesc_dhkey
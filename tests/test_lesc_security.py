@@ -36,14 +36,14 @@
 #
 
 
+import concurrent.futures
 import unittest
-from queue import Queue
-from threading import Thread
+from threading import Event
 import random
 import string
 import logging
 
-from pc_ble_driver_py.observers import BLEDriverObserver, BLEAdapterObserver
+from pc_ble_driver_py.observers import BLEDriverObserver
 from driver_setup import Settings, setup_adapter
 
 from pc_ble_driver_py.ble_driver import (
@@ -52,37 +52,62 @@ from pc_ble_driver_py.ble_driver import (
     BLEGapSecStatus,
     BLEGapSecParams,
     BLEGapSecKDist,
-    util,
     driver
 )
 
 logger = logging.getLogger(__name__)
-passkeyQueue = Queue()
-authStatusQueue = Queue()
+_ADV_ALPHABET = string.ascii_uppercase + string.digits
+_AUTH_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="auth")
 
 
-class Central(BLEDriverObserver, BLEAdapterObserver):
+def _log_future_exception(future):
+    exc = future.exception()
+    if exc is not None:
+        logger.error("Background task failed", exc_info=exc)
+
+
+class Central(BLEDriverObserver):
     def __init__(self, adapter):
         self.adapter = adapter
         logger.info("Central adapter is %d", self.adapter.driver.rpc_adapter.internal)
-        self.conn_q = Queue()
-        self.adapter.observer_register(self)
+        self._conn_evt = Event()
+        self._conn_handle_val = None
         self.adapter.driver.observer_register(self)
         self.conn_handle = None
         self.connecting = False
         self.lesc = True
+        self.peer = None
+        self.keyset = None
+        self.keyset_ready = Event()
+        self._pk_buf = driver.uint8_array(6)
+        self._pk_cast = self._pk_buf.cast()
+
+    def generate_keyset(self):
+        logger.debug("Generate LE Secure Connection ECDH private and public key.")
+        self.keyset = self.adapter.driver.generate_lesc_keyset()
+        self.keyset_ready.set()
 
     def start(self, connect_with):
         self.connect_with = connect_with
+        self._expected_name_bytes = connect_with.encode("ascii")
         self.connecting = False
+        # Generate own LESC keys while scanning, not in the event callback.
+        self.keyset_ready.clear()
+        _AUTH_POOL.submit(self.generate_keyset).add_done_callback(_log_future_exception)
         logger.info("scan_start, trying to find %s", self.connect_with)
         self.adapter.driver.ble_gap_scan_start()
-        self.conn_handle = self.conn_q.get(timeout=10)
-        Thread(
-            target=self.adapter.authenticate,
-            args=(self.conn_handle, None),
-            kwargs={"bond": True, "mitm": True, "lesc": self.lesc, "io_caps": BLEGapIOCaps.keyboard_only},
-        ).start()
+        if not self._conn_evt.wait(timeout=10):
+            raise TimeoutError("Central: no connection to {}".format(connect_with))
+        self.conn_handle = self._conn_handle_val
+        _AUTH_POOL.submit(
+            self.adapter.authenticate,
+            self.conn_handle,
+            None,
+            bond=True,
+            mitm=True,
+            lesc=self.lesc,
+            io_caps=BLEGapIOCaps.keyboard_only,
+        ).add_done_callback(_log_future_exception)
 
     def stop(self):
         self.connecting = False
@@ -100,31 +125,36 @@ class Central(BLEDriverObserver, BLEAdapterObserver):
         else:
             return
 
-        dev_name = "".join(chr(e) for e in dev_name_list)
+        name_bytes = bytes(dev_name_list)
 
-        if dev_name == self.connect_with and self.connecting is False:
+        if name_bytes == self._expected_name_bytes and self.connecting is False:
             self.connecting = True
-            address_string = "".join("{0:02X}".format(b) for b in peer_addr.addr)
-            logger.info(
-                "Trying to connect to peripheral advertising as %s, address: 0x%s",
-                dev_name,
-                address_string,
-            )
+            if logger.isEnabledFor(logging.INFO):
+                dev_name = name_bytes.decode("ascii", errors="ignore")
+                address_string = bytes(peer_addr.addr).hex().upper()
+                logger.info(
+                    "Trying to connect to peripheral advertising as %s, address: 0x%s",
+                    dev_name,
+                    address_string,
+                )
 
             self.adapter.connect(peer_addr, tag=1)
 
     def on_gap_evt_connected(
         self, ble_driver, conn_handle, peer_addr, role, conn_params
     ):
-        self.conn_q.put(conn_handle)
+        self._conn_handle_val = conn_handle
+        self._conn_evt.set()
 
     def on_gap_evt_sec_params_request(self, ble_driver, conn_handle, peer_params):
-        logger.info("Central on_gap_evt_sec_params_request. peer_params.lesc={}".format(peer_params.lesc))
-        # Generate own private and public lesc keys if lesc is enabled.
+        logger.info("Central on_gap_evt_sec_params_request. peer_params.lesc=%s", peer_params.lesc)
+        # Reply with own private and public lesc keys if lesc is enabled.
         if peer_params.lesc and self.lesc:
-            logger.debug("Generate LE Secure Connection ECDH private and public key.")
-            keyset = self.adapter.driver.generate_lesc_keyset()
-            ble_driver.ble_gap_sec_params_reply(conn_handle, BLEGapSecStatus.success, None, keyset)
+            if not self.keyset_ready.wait(timeout=10):
+                logger.error("LESC keyset not available, rejecting pairing.")
+                ble_driver.ble_gap_sec_params_reply(conn_handle, BLEGapSecStatus.unspecified, None)
+                return
+            ble_driver.ble_gap_sec_params_reply(conn_handle, BLEGapSecStatus.success, None, self.keyset)
 
     def on_gap_evt_lesc_dhkey_request(self, ble_driver, conn_handle, peer_public_key, oobd_req):
         logger.info("Central on_gap_evt_lesc_dhkey_request.")
@@ -135,26 +165,36 @@ class Central(BLEDriverObserver, BLEAdapterObserver):
         self, ble_driver, conn_handle, **kwargs
     ):
         logger.info("Central on_gap_evt_auth_key_request.")
-        passkey = passkeyQueue.get(timeout=10)
-        pk = util.list_to_uint8_array(passkey)
+        if not self.peer.passkey_event.wait(timeout=10):
+            raise TimeoutError("Central: no passkey displayed by peer")
+        passkey = self.peer.passkey_val
+        for i, b in enumerate(passkey):
+            self._pk_buf[i] = b
 
         driver.sd_ble_gap_auth_key_reply(
             ble_driver.rpc_adapter,
             conn_handle,
             kwargs['key_type'],
-            pk.cast(),
+            self._pk_cast,
         )
 
 
-class Peripheral(BLEDriverObserver, BLEAdapterObserver):
+class Peripheral(BLEDriverObserver):
+    _KDIST = BLEGapSecKDist(True, True, False, False)
+
     def __init__(self, adapter):
         self.adapter = adapter
         logger.info(
             "Peripheral adapter is %d", self.adapter.driver.rpc_adapter.internal
         )
-        self.conn_q = Queue()
-        self.adapter.observer_register(self)
+        self.conn_handle = None
+        self.passkey_event = Event()
+        self.passkey_val = None
+        self.auth_event = Event()
+        self.auth_status = None
         self.adapter.driver.observer_register(self)
+        logger.debug("Generate LE Secure Connection ECDH private and public key.")
+        self.keyset = self.adapter.driver.generate_lesc_keyset()
 
     def start(self, adv_name):
         adv_data = BLEAdvData(complete_local_name=adv_name)
@@ -164,7 +204,7 @@ class Peripheral(BLEDriverObserver, BLEAdapterObserver):
     def on_gap_evt_connected(
         self, ble_driver, conn_handle, peer_addr, role, conn_params
     ):
-        self.conn_q.put(conn_handle)
+        self.conn_handle = conn_handle
 
     def on_gap_evt_sec_params_request(self, ble_driver, conn_handle, **kwargs):
         logger.info("Peripheral: on_gap_evt_sec_params_request.")
@@ -175,12 +215,10 @@ class Peripheral(BLEDriverObserver, BLEAdapterObserver):
         sec_params.io_caps = BLEGapIOCaps.display_only
         sec_params.lesc = True
         sec_params.min_key_size = 7
-        sec_params.kdist_own = BLEGapSecKDist(True, True, False, False)
-        sec_params.kdist_peer = BLEGapSecKDist(True, True, False, False)
+        sec_params.kdist_own = type(self)._KDIST
+        sec_params.kdist_peer = type(self)._KDIST
 
-        logger.debug("Generate LE Secure Connection ECDH private and public key.")
-        keyset = self.adapter.driver.generate_lesc_keyset()
-        ble_driver.ble_gap_sec_params_reply(conn_handle, BLEGapSecStatus.success, sec_params, keyset)
+        ble_driver.ble_gap_sec_params_reply(conn_handle, BLEGapSecStatus.success, sec_params, self.keyset)
 
     def on_gap_evt_lesc_dhkey_request(self, ble_driver, conn_handle, peer_public_key, oobd_req):
         logger.info("Peripheral: on_gap_evt_lesc_dhkey_request.")
@@ -190,10 +228,11 @@ class Peripheral(BLEDriverObserver, BLEAdapterObserver):
 
     def on_gap_evt_passkey_display(self, ble_driver, conn_handle, passkey):
         logger.info("Peripheral on_gap_evt_passkey_display.")
-        passkeyQueue.put(passkey)
+        self.passkey_val = passkey
+        self.passkey_event.set()
 
     def on_gap_evt_conn_sec_update(self, ble_driver, conn_handle, conn_sec):
-        logger.info(f"Conn sec update: {conn_sec}")
+        logger.info("Conn sec update: %s", conn_sec)
 
     def on_gap_evt_auth_status(
                         self,
@@ -208,7 +247,8 @@ class Peripheral(BLEDriverObserver, BLEAdapterObserver):
                         auth_status
                     ):
         logger.info("Peripheral on_gap_evt_auth_status.")
-        authStatusQueue.put(auth_status)
+        self.auth_status = auth_status
+        self.auth_event.set()
 
 
 class LESCSecurity(unittest.TestCase):
@@ -237,16 +277,15 @@ class LESCSecurity(unittest.TestCase):
 
         # Advertising name used by peripheral and central
         # to find peripheral and connect with it
-        self.adv_name = "".join(
-            random.choice(string.ascii_uppercase + string.digits) for _ in range(20)
-        )
+        self.adv_name = "".join(random.choices(_ADV_ALPHABET, k=20))
         self.peripheral = Peripheral(peripheral)
+        self.central.peer = self.peripheral
 
     def test_lesc_security(self):
         self.peripheral.start(self.adv_name)
         self.central.start(self.adv_name)
-        authStatus = authStatusQueue.get(timeout=200)
-        self.assertTrue(authStatus == BLEGapSecStatus.success)
+        self.assertTrue(self.peripheral.auth_event.wait(200))
+        self.assertEqual(self.peripheral.auth_status, BLEGapSecStatus.success)
 
     def tearDown(self):
         self.central.adapter.close()